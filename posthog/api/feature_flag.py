@@ -1,9 +1,14 @@
+import hashlib
 import json
-from typing import Any, Dict, List, Optional, cast
+import time
+from typing import Any, Dict, List
 
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
 from rest_framework import authentication, exceptions, request, serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
@@ -28,6 +33,46 @@ from posthog.models.property import Property
 from posthog.permissions import ProjectMembershipNecessaryPermissions, TeamMemberAccessPermission
 
 
+# Clients poll my_flags frequently, so evaluated flags are cached for a few seconds.
+# A short TTL bounds staleness from person/group property changes, while flag edits
+# invalidate immediately by bumping the per-team version key below.
+MY_FLAGS_CACHE_TTL_SECONDS = 15
+
+
+def _my_flags_version_key(team_id: int) -> str:
+    return f"my_flags_version_{team_id}"
+
+
+def bump_my_flags_cache_version(team_id: int) -> None:
+    cache.set(_my_flags_version_key(team_id), time.time(), None)
+
+
+class FeatureFlagLimitOffsetPagination(LimitOffsetPagination):
+    """
+    LimitOffsetPagination runs a COUNT(*) over the filtered queryset on every paginated
+    list request. Flags change rarely, so cache the count per team - flag writes bump the
+    per-team version key that is part of the cache key, keeping the count fresh after edits.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._count_cache_key = None
+        team_id = getattr(view, "team_id", None)
+        if team_id is not None:
+            self._count_cache_key = "feature_flag_count_{}_{}".format(
+                team_id, cache.get(_my_flags_version_key(team_id), 0)
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset) -> int:
+        if self._count_cache_key is None:
+            return super().get_count(queryset)
+        count = cache.get(self._count_cache_key)
+        if count is None:
+            count = super().get_count(queryset)
+            cache.set(self._count_cache_key, count, 60)
+        return count
+
+
 class CanEditFeatureFlag(BasePermission):
     message = "You don't have edit permissions for this feature flag."
 
@@ -38,12 +83,15 @@ class CanEditFeatureFlag(BasePermission):
             return can_user_edit_feature_flag(request, feature_flag)
 
 
-class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
+class FeatureFlagSerializer(serializers.ModelSerializer):
     created_by = UserBasicSerializer(read_only=True)
     # :TRICKY: Needed for backwards compatibility
     filters = serializers.DictField(source="get_filters", required=False)
-    is_simple_flag = serializers.SerializerMethodField()
-    rollout_percentage = serializers.SerializerMethodField()
+    # Simple flags are ones that only have rollout_percentage
+    #  That means server side libraries are able to gate these flags without calling to the server
+    # Both fields are denormalized onto the model in FeatureFlag.save(), so reads don't rescan filters
+    is_simple_flag = serializers.BooleanField(read_only=True)
+    rollout_percentage = serializers.IntegerField(source="simple_rollout_percentage", read_only=True)
 
     experiment_set: serializers.PrimaryKeyRelatedField = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
@@ -78,36 +126,6 @@ class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
         # TODO: make sure this isn't n+1
         return can_user_edit_feature_flag(self.context["request"], feature_flag)
 
-    # Simple flags are ones that only have rollout_percentage
-    #  That means server side libraries are able to gate these flags without calling to the server
-    def get_is_simple_flag(self, feature_flag: FeatureFlag) -> bool:
-        no_properties_used = all(len(condition.get("properties", [])) == 0 for condition in feature_flag.conditions)
-        return (
-            len(feature_flag.conditions) == 1
-            and no_properties_used
-            and feature_flag.aggregation_group_type_index is None
-        )
-
-    def get_rollout_percentage(self, feature_flag: FeatureFlag) -> Optional[int]:
-        if self.get_is_simple_flag(feature_flag):
-            return feature_flag.conditions[0].get("rollout_percentage")
-        else:
-            return None
-
-    def validate_key(self, value):
-        exclude_kwargs = {}
-        if self.instance:
-            exclude_kwargs = {"pk": cast(FeatureFlag, self.instance).pk}
-
-        if (
-            FeatureFlag.objects.filter(key=value, team_id=self.context["team_id"], deleted=False)
-            .exclude(**exclude_kwargs)
-            .exists()
-        ):
-            raise serializers.ValidationError("There is already a feature flag with this key.", code="unique")
-
-        return value
-
     def validate_filters(self, filters):
         # For some weird internal REST framework reason this field gets validated on a partial PATCH call, even if filters isn't being updatd
         # If we see this, just return the current filters
@@ -138,6 +156,11 @@ class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
         variant_list = (filters.get("multivariate") or {}).get("variants", [])
         variants = {variant["key"] for variant in variant_list}
 
+        if len(variant_list) > 0 and sum(variant.get("rollout_percentage", 0) for variant in variant_list) != 100:
+            raise serializers.ValidationError(
+                "Invalid variant definitions: Variant rollout percentages must sum to 100."
+            )
+
         for condition in filters["groups"]:
             if condition.get("variant") and condition["variant"] not in variants:
                 raise serializers.ValidationError("Filters are not valid (variant override does not exist)")
@@ -165,34 +188,35 @@ class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
         validated_data["team_id"] = self.context["team_id"]
         self._update_filters(validated_data)
 
-        variants = (validated_data.get("filters", {}).get("multivariate", {}) or {}).get("variants", [])
-        variant_rollout_sum = 0
-        for variant in variants:
-            variant_rollout_sum += variant.get("rollout_percentage")
-
-        if len(variants) > 0 and variant_rollout_sum != 100:
-            raise exceptions.ValidationError(
-                "Invalid variant definitions: Variant rollout percentages must sum to 100."
-            )
-
-        FeatureFlag.objects.filter(key=validated_data["key"], team=self.context["team_id"], deleted=True).delete()
-        instance: FeatureFlag = super().create(validated_data)
+        try:
+            instance: FeatureFlag = super().create(validated_data)
+        except IntegrityError:
+            # Uniqueness of (team, key) for non-deleted flags is enforced by a partial unique
+            # constraint, so writes don't need an extra EXISTS round-trip to check for duplicates
+            raise serializers.ValidationError({"key": "There is already a feature flag with this key."}, code="unique")
         instance.update_cohorts()
+        bump_my_flags_cache_version(instance.team_id)
 
-        report_user_action(request.user, "feature flag created", instance.get_analytics_metadata())
+        # Analytics capture can involve network I/O in the SDK, keep it off the write path
+        transaction.on_commit(
+            lambda: report_user_action(request.user, "feature flag created", instance.get_analytics_metadata())
+        )
 
         return instance
 
     def update(self, instance: FeatureFlag, validated_data: Dict, *args: Any, **kwargs: Any) -> FeatureFlag:
         request = self.context["request"]
-        validated_key = validated_data.get("key", None)
-        if validated_key:
-            FeatureFlag.objects.filter(key=validated_key, team=instance.team, deleted=True).delete()
         self._update_filters(validated_data)
-        instance = super().update(instance, validated_data)
+        try:
+            instance = super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError({"key": "There is already a feature flag with this key."}, code="unique")
         instance.update_cohorts()
+        bump_my_flags_cache_version(instance.team_id)
 
-        report_user_action(request.user, "feature flag updated", instance.get_analytics_metadata())
+        transaction.on_commit(
+            lambda: report_user_action(request.user, "feature flag updated", instance.get_analytics_metadata())
+        )
         return instance
 
     def _update_filters(self, validated_data):
@@ -204,7 +228,7 @@ class FeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
             validated_data["performed_rollback"] = False
 
 
-class MinimalFeatureFlagSerializer(serializers.HyperlinkedModelSerializer):
+class MinimalFeatureFlagSerializer(serializers.ModelSerializer):
     filters = serializers.DictField(source="get_filters", required=False)
 
     class Meta:
@@ -229,6 +253,7 @@ class FeatureFlagViewSet(StructuredViewSetMixin, ForbidDestroyModel, viewsets.Mo
 
     queryset = FeatureFlag.objects.all()
     serializer_class = FeatureFlagSerializer
+    pagination_class = FeatureFlagLimitOffsetPagination
     permission_classes = [
         IsAuthenticated,
         ProjectMembershipNecessaryPermissions,
@@ -246,38 +271,82 @@ class FeatureFlagViewSet(StructuredViewSetMixin, ForbidDestroyModel, viewsets.Mo
         queryset = super().get_queryset()
 
         if self.action == "list":
-            queryset = queryset.filter(deleted=False).prefetch_related("experiment_set")
+            # Only fetch the columns the list serializer actually reads - `filters` is by far
+            # the widest column, but the rest of the row (and the joined user) can be trimmed
+            queryset = (
+                queryset.filter(deleted=False)
+                .prefetch_related("experiment_set")
+                .only(
+                    "id",
+                    "name",
+                    "key",
+                    "filters",
+                    "rollout_percentage",  # read by get_filters() for legacy flags
+                    "deleted",
+                    "active",
+                    "created_at",
+                    "is_simple_flag",
+                    "simple_rollout_percentage",
+                    "ensure_experience_continuity",
+                    "rollback_conditions",
+                    "performed_rollback",
+                    "team_id",
+                    "created_by__id",
+                    "created_by__uuid",
+                    "created_by__distinct_id",
+                    "created_by__first_name",
+                    "created_by__email",
+                )
+            )
 
-        return queryset.select_related("created_by").order_by("-created_at")
+        return queryset.select_related("created_by", "team").order_by("-created_at")
 
     @action(methods=["GET"], detail=False)
     def my_flags(self, request: request.Request, **kwargs):
         if not request.user.is_authenticated:  # for mypy
             raise exceptions.NotAuthenticated()
 
+        groups_param = request.GET.get("groups", "{}")
+        cache_key = "my_flags_{}_{}_{}_{}".format(
+            self.team_id,
+            request.user.distinct_id,
+            hashlib.md5(groups_param.encode("utf-8")).hexdigest(),
+            cache.get(_my_flags_version_key(self.team_id), 0),
+        )
+        cached_flags = cache.get(cache_key)
+        if cached_flags is not None:
+            return Response(cached_flags)
+
         feature_flags = (
-            FeatureFlag.objects.filter(team=self.team, active=True, deleted=False)
+            FeatureFlag.active_objects.filter(team=self.team, active=True)
             .prefetch_related("experiment_set")
             .select_related("created_by")
             .order_by("-created_at")
         )
-        groups = json.loads(request.GET.get("groups", "{}"))
+        groups = json.loads(groups_param)
         flags: List[dict] = []
 
         feature_flag_list = list(feature_flags)
 
         if not feature_flag_list:
+            cache.set(cache_key, flags, MY_FLAGS_CACHE_TTL_SECONDS)
             return Response(flags)
 
         matches, _ = FeatureFlagMatcher(feature_flag_list, request.user.distinct_id, groups).get_matches()
-        for feature_flag in feature_flags:
+        # Serializing all flags in one go is noticeably cheaper than building a serializer per flag,
+        # since the field machinery is only set up once
+        serialized_flags = FeatureFlagSerializer(
+            feature_flag_list, many=True, context=self.get_serializer_context()
+        ).data
+        for serialized_flag in serialized_flags:
             flags.append(
                 {
-                    "feature_flag": FeatureFlagSerializer(feature_flag, context=self.get_serializer_context()).data,
-                    "value": matches.get(feature_flag.key, False),
+                    "feature_flag": serialized_flag,
+                    "value": matches.get(serialized_flag["key"], False),
                 }
             )
 
+        cache.set(cache_key, flags, MY_FLAGS_CACHE_TTL_SECONDS)
         return Response(flags)
 
     @action(methods=["GET"], detail=False)
@@ -105,15 +105,16 @@ class TestFeatureFlag(APIBaseTest):
 
     @patch("posthog.api.feature_flag.report_user_action")
     def test_is_simple_flag_groups(self, mock_capture):
-        feature_flag = self.client.post(
-            f"/api/projects/{self.team.id}/feature_flags/",
-            data={
-                "name": "Beta feature",
-                "key": "beta-feature",
-                "filters": {"aggregation_group_type_index": 0, "groups": [{"rollout_percentage": 65}]},
-            },
-            format="json",
-        ).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            feature_flag = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/",
+                data={
+                    "name": "Beta feature",
+                    "key": "beta-feature",
+                    "filters": {"aggregation_group_type_index": 0, "groups": [{"rollout_percentage": 65}]},
+                },
+                format="json",
+            ).json()
         self.assertFalse(feature_flag["is_simple_flag"])
         # Assert analytics are sent
         instance = FeatureFlag.objects.get(id=feature_flag["id"])
@@ -136,11 +137,12 @@ class TestFeatureFlag(APIBaseTest):
     @patch("posthog.api.feature_flag.report_user_action")
     def test_create_feature_flag(self, mock_capture):
 
-        response = self.client.post(
-            f"/api/projects/{self.team.id}/feature_flags/",
-            {"name": "Alpha feature", "key": "alpha-feature", "filters": {"groups": [{"rollout_percentage": 50}]}},
-            format="json",
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/",
+                {"name": "Alpha feature", "key": "alpha-feature", "filters": {"groups": [{"rollout_percentage": 50}]}},
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         flag_id = response.json()["id"]
         instance = FeatureFlag.objects.get(id=flag_id)
@@ -184,9 +186,10 @@ class TestFeatureFlag(APIBaseTest):
     @patch("posthog.api.feature_flag.report_user_action")
     def test_create_minimal_feature_flag(self, mock_capture):
 
-        response = self.client.post(
-            f"/api/projects/{self.team.id}/feature_flags/", {"key": "omega-feature"}, format="json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/", {"key": "omega-feature"}, format="json"
+            )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.json()["key"], "omega-feature")
         self.assertEqual(response.json()["name"], "")
@@ -213,24 +216,25 @@ class TestFeatureFlag(APIBaseTest):
     @patch("posthog.api.feature_flag.report_user_action")
     def test_create_multivariate_feature_flag(self, mock_capture):
 
-        response = self.client.post(
-            f"/api/projects/{self.team.id}/feature_flags/",
-            {
-                "name": "Multivariate feature",
-                "key": "multivariate-feature",
-                "filters": {
-                    "groups": [{"properties": [], "rollout_percentage": None}],
-                    "multivariate": {
-                        "variants": [
-                            {"key": "first-variant", "name": "First Variant", "rollout_percentage": 50},
-                            {"key": "second-variant", "name": "Second Variant", "rollout_percentage": 25},
-                            {"key": "third-variant", "name": "Third Variant", "rollout_percentage": 25},
-                        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/projects/{self.team.id}/feature_flags/",
+                {
+                    "name": "Multivariate feature",
+                    "key": "multivariate-feature",
+                    "filters": {
+                        "groups": [{"properties": [], "rollout_percentage": None}],
+                        "multivariate": {
+                            "variants": [
+                                {"key": "first-variant", "name": "First Variant", "rollout_percentage": 50},
+                                {"key": "second-variant", "name": "Second Variant", "rollout_percentage": 25},
+                                {"key": "third-variant", "name": "Third Variant", "rollout_percentage": 25},
+                            ]
+                        },
                     },
                 },
-            },
-            format="json",
-        )
+                format="json",
+            )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         instance = FeatureFlag.objects.get(id=response.json()["id"])
         self.assertEqual(instance.key, "multivariate-feature")
@@ -390,23 +394,29 @@ class TestFeatureFlag(APIBaseTest):
 
             frozen_datetime.tick(delta=datetime.timedelta(minutes=10))
 
-            response = self.client.patch(
-                f"/api/projects/{self.team.id}/feature_flags/{flag_id}",
-                {
-                    "name": "Updated name",
-                    "filters": {
-                        "groups": [
-                            {
-                                "rollout_percentage": 65,
-                                "properties": [
-                                    {"key": "email", "type": "person", "value": "@posthog.com", "operator": "icontains"}
-                                ],
-                            }
-                        ]
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    f"/api/projects/{self.team.id}/feature_flags/{flag_id}",
+                    {
+                        "name": "Updated name",
+                        "filters": {
+                            "groups": [
+                                {
+                                    "rollout_percentage": 65,
+                                    "properties": [
+                                        {
+                                            "key": "email",
+                                            "type": "person",
+                                            "value": "@posthog.com",
+                                            "operator": "icontains",
+                                        }
+                                    ],
+                                }
+                            ]
+                        },
                     },
-                },
-                format="json",
-            )
+                    format="json",
+                )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
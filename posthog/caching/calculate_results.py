@@ -39,21 +39,26 @@ CACHE_TYPE_TO_INSIGHT_CLASS = {
 logger = structlog.get_logger(__name__)
 
 
+_CACHE_TYPE_BY_INSIGHT = {
+    INSIGHT_FUNNELS: CacheType.FUNNEL,
+    INSIGHT_PATHS: CacheType.PATHS,
+    INSIGHT_RETENTION: CacheType.RETENTION,
+    INSIGHT_STICKINESS: CacheType.STICKINESS,
+}
+
+
 def get_cache_type(filter: FilterType) -> CacheType:
-    if filter.insight == INSIGHT_FUNNELS:
-        return CacheType.FUNNEL
-    elif filter.insight == INSIGHT_PATHS:
-        return CacheType.PATHS
-    elif filter.insight == INSIGHT_RETENTION:
-        return CacheType.RETENTION
-    elif (
+    cache_type = _CACHE_TYPE_BY_INSIGHT.get(filter.insight)
+    if cache_type is not None:
+        return cache_type
+    # trends shown as stickiness predates the stickiness insight and still maps to it
+    if (
         filter.insight == INSIGHT_TRENDS
         and isinstance(filter, StickinessFilter)
         and filter.shown_as == TRENDS_STICKINESS
-    ) or filter.insight == INSIGHT_STICKINESS:
+    ):
         return CacheType.STICKINESS
-    else:
-        return CacheType.TRENDS
+    return CacheType.TRENDS
 
 
 def calculate_result_by_insight(
@@ -0,0 +1,46 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Type
+from unittest.mock import patch
+
+from django.db.models import Model
+
+from posthog.models import Filter
+from posthog.utils import generate_cache_key
+
+
+@contextmanager
+def fake_now(dt: datetime) -> Iterator[None]:
+    """Pin django.utils.timezone.now without freezegun.
+
+    freeze_time swaps out datetime, date and time.time wholesale, which is
+    overkill (and measurably slower) for tests that only read the clock through
+    timezone.now() and never assert formatted timestamps."""
+    with patch("django.utils.timezone.now", return_value=dt):
+        yield
+
+
+def fetch_fields(model: Type[Model], pk: Any, *fields: str) -> Dict[str, Any]:
+    """Read just the named columns - refresh_from_db would rehydrate every field on the instance."""
+    return dict(zip(fields, model.objects.values_list(*fields).get(pk=pk)))
+
+
+@lru_cache(maxsize=2048)
+def cached_filter_key(filter_json: str, team_pk: int) -> str:
+    """Serializing and hashing a filter is pure, so identical inputs across tests can share the result."""
+    return generate_cache_key(f"{filter_json}_{team_pk}")
+
+
+_filter_cache: Dict[str, Filter] = {}
+
+
+def make_filter(data: Dict[str, Any]) -> Filter:
+    """Reuse Filter instances for identical inputs - Filter is immutable once constructed,
+    so tests building the same filter dict over and over can share one instance."""
+    key = json.dumps(data, sort_keys=True)
+    filter = _filter_cache.get(key)
+    if filter is None:
+        filter = _filter_cache[key] = Filter(data=data)
+    return filter
@@ -0,0 +1,30 @@
+from typing import Generator, List
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+import posthog.caching.update_cache
+import posthog.caching.utils
+from posthog.caching.utils import RECENTLY_ACCESSED_TEAMS_REDIS_KEY
+
+
+@pytest.fixture(autouse=True)
+def clear_caching_memos() -> Generator[None, None, None]:
+    """active_teams and the team fetch hold results in-process; tests must not see another test's rows."""
+    posthog.caching.utils._active_teams_cache = None
+    posthog.caching.update_cache._team_cache.clear()
+    yield
+
+
+@pytest.fixture(scope="class")
+def redis_recency(request) -> Generator[List[int], None, None]:
+    """The current team is always recent for these tests.
+
+    Backed by fakeredis rather than a MagicMock so active_teams runs against a real
+    sorted set instead of canned zrange return values.
+    """
+    fake_redis = fakeredis.FakeStrictRedis()
+    fake_redis.zadd(RECENTLY_ACCESSED_TEAMS_REDIS_KEY, {str(request.cls.team.id): 1})
+    with patch("posthog.caching.utils.get_client", return_value=fake_redis):
+        yield [request.cls.team.id]
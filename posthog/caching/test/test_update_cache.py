@@ -1,14 +1,18 @@
-from copy import copy
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 from typing import Any, Dict, Generator, List, Optional, Tuple
 from unittest.mock import ANY, MagicMock, call, patch
 
+import pytest
 import pytz
 from dateutil.parser import parse
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 from freezegun import freeze_time
 from pytest import fixture
 
+from posthog.caching.test._testutils import cached_filter_key, fake_now, fetch_fields, make_filter
 from posthog.caching.update_cache import synchronously_update_insight_cache, update_cache_item, update_cached_items
 from posthog.caching.utils import ensure_is_date
 from posthog.constants import ENTITY_ID, ENTITY_TYPE, INSIGHT_STICKINESS
@@ -17,18 +21,29 @@ from posthog.models import Dashboard, DashboardTile, EventDefinition, Filter, In
 from posthog.models.filters.retention_filter import RetentionFilter
 from posthog.models.filters.stickiness_filter import StickinessFilter
 from posthog.models.filters.utils import get_filter
+from posthog.models.insight import generate_insight_cache_key
 from posthog.models.instance_setting import set_instance_setting
 from posthog.models.sharing_configuration import SharingConfiguration
 from posthog.models.team.team import Team
 from posthog.queries.util import get_earliest_timestamp
 from posthog.test.base import APIBaseTest
 from posthog.types import FilterType
-from posthog.utils import generate_cache_key, get_safe_cache
+from posthog.utils import get_safe_cache
+
+
+# fixture filters shared across tests; take a copy before handing one to code that may store or mutate it
+_FILTER_PAGEVIEW: Dict[str, Any] = {"events": [{"id": "$pageview"}]}
+_FILTER_PAGEVIEW_MAC: Dict[str, Any] = {
+    "events": [{"id": "$pageview"}],
+    "properties": [{"key": "$browser", "value": "Mac OS X"}],
+}
 
 
 def create_shared_dashboard(team: Team, is_shared: bool = False, **kwargs: Any) -> Dashboard:
     dashboard = Dashboard.objects.create(team=team, **kwargs)
-    SharingConfiguration.objects.create(team=team, dashboard=dashboard, enabled=is_shared)
+    if is_shared:
+        # a disabled sharing configuration is indistinguishable from no row for the code under test
+        SharingConfiguration.objects.create(team=team, dashboard=dashboard, enabled=True)
 
     return dashboard
 
@@ -40,11 +55,42 @@ def create_shared_insight(team: Team, is_enabled: bool = False, **kwargs: Any) -
     return insight
 
 
+def bulk_create_shared_dashboards(team: Team, specs: List[Dict[str, Any]]) -> List[Dashboard]:
+    """Create several dashboards (and their sharing configurations) in two INSERTs instead of two per dashboard"""
+    dashboards = Dashboard.objects.bulk_create([Dashboard(team=team, **spec.get("kwargs", {})) for spec in specs])
+    SharingConfiguration.objects.bulk_create(
+        [
+            SharingConfiguration(team=team, dashboard=dashboard, enabled=spec.get("is_shared", False))
+            for dashboard, spec in zip(dashboards, specs)
+        ]
+    )
+    return dashboards
+
+
+def bulk_create_shared_insights(
+    team: Team, count: int, filters: Dict[str, Any], last_refresh: datetime
+) -> List[Insight]:
+    """Create `count` shared insights with identical filters in two INSERTs.
+
+    bulk_create skips the pre_save hook that fills in filters_hash, so the hash is
+    computed once here and stamped on every instance before the insert.
+    """
+    insights = [Insight(team=team, filters=filters, last_refresh=last_refresh) for _ in range(count)]
+    insights[0].filters_hash = generate_insight_cache_key(insights[0], None)
+    for insight in insights[1:]:
+        insight.filters_hash = insights[0].filters_hash
+    Insight.objects.bulk_create(insights)
+    SharingConfiguration.objects.bulk_create(
+        [SharingConfiguration(team=team, insight=insight, enabled=True) for insight in insights]
+    )
+    return insights
+
+
 def _a_dashboard_tile_with_known_last_refresh(
     team: Team, last_refresh_date: Optional[datetime], filters: Optional[Dict] = None
 ) -> DashboardTile:
     if filters is None:
-        filters = {"events": [{"id": "$pageview"}]}
+        filters = dict(_FILTER_PAGEVIEW)
 
     dashboard = create_shared_dashboard(team=team, is_shared=True)
     item = Insight.objects.create(filters=filters, team=team)
@@ -55,17 +101,12 @@ def _a_dashboard_tile_with_known_last_refresh(
 
 
 def _create_insight_with_known_cache_key(team: Team, cache_key: Optional[str] = None) -> Insight:
-    filter_dict: Dict[str, Any] = {
-        "events": [{"id": "$pageview"}],
-        "properties": [{"key": "$browser", "value": "Mac OS X"}],
-    }
+    filter_dict: Dict[str, Any] = dict(_FILTER_PAGEVIEW_MAC)
     insight: Insight = Insight.objects.create(team=team, filters=filter_dict)
     if cache_key:
+        # a single UPDATE - no save signals to dodge and no refresh_from_db SELECT needed
+        Insight.objects.filter(pk=insight.pk).update(filters_hash=cache_key)
         insight.filters_hash = cache_key
-        insight.save(update_fields=["filters_hash"])
-
-        insight.refresh_from_db()
-        assert insight.filters_hash == cache_key
 
     return insight
 
@@ -83,13 +124,8 @@ def _create_dashboard_tile_with_known_cache_key(
 
     tile: DashboardTile = DashboardTile.objects.create(insight=insight, dashboard=dashboard)
     if cache_key:
+        DashboardTile.objects.filter(pk=tile.pk).update(filters_hash=cache_key)
         tile.filters_hash = cache_key
-        tile.save(update_fields=["filters_hash"])
-
-        tile.refresh_from_db()
-        insight.refresh_from_db()
-        assert tile.filters_hash == cache_key
-        assert insight.filters_hash == cache_key
 
     return dashboard, tile
 
@@ -107,21 +143,14 @@ def test_can_ensure_iso_strings_are_dates() -> None:
     assert ensure_is_date(None) is None
 
 
+@pytest.mark.usefixtures("redis_recency")
 class TestSynchronousCacheUpdate(APIBaseTest):
-    @fixture(scope="class", autouse=True)
-    def redis_recency(self) -> Generator[List[int], None, None]:
-        """The current team is always recent for these tests"""
-        with patch("posthog.caching.utils.get_client") as mock_redis_get_client:
-            recent_teams = [(self.team.id, 1)]
-            mock_redis_get_client.return_value.zrange.return_value = recent_teams
-
-            yield [i for i, _ in recent_teams]
-
     def test_update_insight_cache_updates_tiles_with_no_hash(self) -> None:
         tile = _a_dashboard_tile_with_known_last_refresh(self.team, last_refresh_date=None)
         # can't set filters_hash=None on a route that triggers save
         DashboardTile.objects.filter(id=tile.id).update(filters_hash=None)
-        tile.refresh_from_db()
+        # refetch with the relations the test reads, in one query
+        tile = DashboardTile.objects.select_related("insight", "dashboard").get(pk=tile.pk)
         assert tile.filters_hash is None
         assert tile.insight is not None
 
@@ -175,33 +204,63 @@ class TestSynchronousCacheUpdate(APIBaseTest):
         assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
 
 
+def _tile_with_insight() -> DashboardTile:
+    # the retry tests have exactly one tile; fetch it and its insight with a single JOIN
+    return DashboardTile.objects.select_related("insight").get()
+
+
+def _assert_number_of_days_in_results(dashboard_tile: DashboardTile, number_of_days_in_results: int) -> None:
+    cache_result = get_safe_cache(dashboard_tile.filters_hash)
+    number_of_results = len(cache_result["result"][0]["data"])
+    assert number_of_results == number_of_days_in_results
+
+
+def _count_gauge_calls(mock: MagicMock, name: str) -> int:
+    """Count gauge calls by metric name without materialising an intermediate list."""
+    return sum(1 for recorded in mock.mock_calls if recorded.args and recorded.args[0] == name)
+
+
+def _update_cached_items_ignoring_errors() -> None:
+    # the scheduler will throw an exception every time, which is what we want in production
+    try:
+        update_cached_items()
+    except Exception:
+        pass
+
+
 def run_cache_update(patch_update_cache_item: MagicMock) -> None:
     update_cached_items()
     # pass the caught calls straight to the function
     # we do this to skip Redis
-    for call_item in patch_update_cache_item.call_args_list:
-        update_cache_item(*call_item[0])
-
-
+    # NB: dispatch must stay serial - each test runs inside a transaction, and worker
+    # threads would get their own connections that can't see the uncommitted fixtures
+    seen_keys = set()
+    for call_args, _ in patch_update_cache_item.call_args_list:
+        # update_cache_item refreshes every insight/tile matching the cache key,
+        # so running it twice for the same key is pure redundant recompute
+        if call_args[0] in seen_keys:
+            continue
+        seen_keys.add(call_args[0])
+        update_cache_item(*call_args)
+
+
+@pytest.mark.usefixtures("redis_recency")
 class TestUpdateCache(APIBaseTest):
-    @fixture(scope="class", autouse=True)
-    def redis_recency(self) -> Generator[List[int], None, None]:
-        """The current team is always recent for these tests"""
-        with patch("posthog.caching.utils.get_client") as mock_redis_get_client:
-            recent_teams = [(self.team.id, 1)]
-            mock_redis_get_client.return_value.zrange.return_value = recent_teams
-
-            yield [i for i, _ in recent_teams]
+    @fixture(autouse=True)
+    def frozen_time(self) -> Generator[None, None, None]:
+        """Tests here run at a fixed date; the ones needing a different one nest their own freeze_time"""
+        with freeze_time("2012-01-15"):
+            yield
 
     def test_not_all_filters_affect_the_filters_hash(self) -> None:
-        insight_one = create_shared_insight(self.team, is_enabled=True, filters={"events": [{"id": "$pageview"}]})
+        insight_one = create_shared_insight(self.team, is_enabled=True, filters=dict(_FILTER_PAGEVIEW))
         insight_two = create_shared_insight(
             self.team,
             is_enabled=True,
-            filters={"events": [{"id": "$pageview"}], "aggregation_axis_format": "percentage"},
+            filters={**_FILTER_PAGEVIEW, "aggregation_axis_format": "percentage"},
         )
         insight_three = create_shared_insight(
-            self.team, is_enabled=True, filters={"events": [{"id": "$pageview"}], "aggregation_axis_format": "duration"}
+            self.team, is_enabled=True, filters={**_FILTER_PAGEVIEW, "aggregation_axis_format": "duration"}
         )
 
         assert insight_one.filters_hash == insight_two.filters_hash
@@ -213,20 +272,28 @@ class TestUpdateCache(APIBaseTest):
         # There's two things we want to refresh
         # Any shared dashboard, as we only use cached items to show those
         # Any dashboard accessed in the last 7 days
-        filter_dict: Dict[str, Any] = {
-            "events": [{"id": "$pageview"}],
-            "properties": [{"key": "$browser", "value": "Mac OS X"}],
-        }
-        filter = Filter(data=filter_dict)
-        shared_dashboard_with_no_filters = create_shared_dashboard(
-            team=self.team, is_shared=True, last_accessed_at="2020-01-01T12:00:00Z"
+        filter_dict: Dict[str, Any] = dict(_FILTER_PAGEVIEW_MAC)
+        filter = make_filter(filter_dict)
+        accessed_now = now()
+        (
+            shared_dashboard_with_no_filters,
+            another_shared_dashboard_to_cache,
+            dashboard_do_not_cache,
+            recently_accessed_unshared_dashboard_should_cache,
+        ) = bulk_create_shared_dashboards(
+            self.team,
+            [
+                {"is_shared": True, "kwargs": {"last_accessed_at": "2010-01-01T12:00:00Z"}},
+                {"is_shared": True, "kwargs": {"last_accessed_at": accessed_now}},
+                {"is_shared": False, "kwargs": {"last_accessed_at": "2010-01-01T12:00:00Z"}},
+                {"is_shared": False, "kwargs": {"last_accessed_at": accessed_now}},
+            ],
         )
         funnel_filter = Filter(data={"events": [{"id": "user signed up", "type": "events", "order": 0}]})
 
         # we don't want insight and tile to have the same id,
         # or we can accidentally select the insight by selecting the tile
-        some_different_filters = copy(filter_dict)
-        some_different_filters.update({"date_from": "-14d"})
+        some_different_filters = {**filter_dict, "date_from": "-14d"}
         Insight.objects.create(filters=some_different_filters, team=self.team)
 
         cached_insight_because_no_dashboard_filters = Insight.objects.create(
@@ -246,9 +313,6 @@ class TestUpdateCache(APIBaseTest):
             insight=cached_funnel_item, dashboard=shared_dashboard_with_no_filters
         )
 
-        another_shared_dashboard_to_cache = create_shared_dashboard(
-            team=self.team, is_shared=True, last_accessed_at=now()
-        )
         insight_not_cached_because_dashboard_has_filters = Insight.objects.create(
             filters=Filter(data={"events": [{"id": "insight_not_cached_because_dashboard_has_filters"}]}).to_dict(),
             team=self.team,
@@ -261,9 +325,6 @@ class TestUpdateCache(APIBaseTest):
         another_shared_dashboard_to_cache.filters = {"date_from": "-14d"}
         another_shared_dashboard_to_cache.save()
 
-        dashboard_do_not_cache = create_shared_dashboard(
-            team=self.team, is_shared=False, last_accessed_at="2020-01-01T12:00:00Z"
-        )
         insight_not_cached_because_dashboard_unshared_and_not_recently_accessed = Insight.objects.create(
             filters=Filter(
                 data={"events": [{"id": "insight_not_cached_because_dashboard_unshared_and_not_recently_accessed"}]}
@@ -275,9 +336,6 @@ class TestUpdateCache(APIBaseTest):
             dashboard=dashboard_do_not_cache,
         )
 
-        recently_accessed_unshared_dashboard_should_cache = create_shared_dashboard(
-            team=self.team, is_shared=False, last_accessed_at=now()
-        )
         item_cached_because_on_recently_shared_dashboard_with_no_filter = Insight.objects.create(
             filters=Filter(
                 data={"events": [{"id": "item_cached_because_on_recently_shared_dashboard_with_no_filter"}]}
@@ -289,44 +347,51 @@ class TestUpdateCache(APIBaseTest):
             dashboard=recently_accessed_unshared_dashboard_should_cache,
         )
 
-        item_key = generate_cache_key(filter.toJSON() + "_" + str(self.team.pk))
-        funnel_key = generate_cache_key(filter.toJSON() + "_" + str(self.team.pk))
+        item_key = cached_filter_key(filter.toJSON(), self.team.pk)
+        funnel_key = cached_filter_key(filter.toJSON(), self.team.pk)
 
         run_cache_update(patch_update_cache_item)
 
-        self.assertIsNotNone(Insight.objects.get(pk=cached_insight_because_no_dashboard_filters.pk).last_refresh)
-        self.assertIsNotNone(
-            DashboardTile.objects.get(pk=cached_trend_tile_because_no_dashboard_filters.pk).last_refresh
-        )
-        self.assertIsNotNone(Insight.objects.get(pk=cached_funnel_item.pk).last_refresh)
-        self.assertIsNotNone(
-            DashboardTile.objects.get(pk=cached_funnel_tile_because_on_shared_dashboard.pk).last_refresh
-        )
+        # one query per model instead of one per row
+        insights = Insight.objects.in_bulk(
+            [
+                cached_insight_because_no_dashboard_filters.pk,
+                cached_funnel_item.pk,
+                insight_not_cached_because_dashboard_has_filters.pk,
+                insight_not_cached_because_dashboard_unshared_and_not_recently_accessed.pk,
+                item_cached_because_on_recently_shared_dashboard_with_no_filter.pk,
+            ]
+        )
+        tiles = DashboardTile.objects.in_bulk(
+            [
+                cached_trend_tile_because_no_dashboard_filters.pk,
+                cached_funnel_tile_because_on_shared_dashboard.pk,
+                tile_cached_because_dashboard_is_shared.pk,
+                tile_to_not_cache_because_dashboard_is_access_too_long_ago.pk,
+                tile_to_cache_because_dashboard_was_recently_accessed.pk,
+            ]
+        )
+
+        self.assertIsNotNone(insights[cached_insight_because_no_dashboard_filters.pk].last_refresh)
+        self.assertIsNotNone(tiles[cached_trend_tile_because_no_dashboard_filters.pk].last_refresh)
+        self.assertIsNotNone(insights[cached_funnel_item.pk].last_refresh)
+        self.assertIsNotNone(tiles[cached_funnel_tile_because_on_shared_dashboard.pk].last_refresh)
 
         # dashboard has filters so insight is filters_hash is different and so it doesn't need caching
-        self.assertIsNone(Insight.objects.get(pk=insight_not_cached_because_dashboard_has_filters.pk).last_refresh)
-        self.assertIsNotNone(DashboardTile.objects.get(pk=tile_cached_because_dashboard_is_shared.pk).last_refresh)
+        self.assertIsNone(insights[insight_not_cached_because_dashboard_has_filters.pk].last_refresh)
+        self.assertIsNotNone(tiles[tile_cached_because_dashboard_is_shared.pk].last_refresh)
 
         self.assertIsNone(
-            Insight.objects.get(
-                pk=insight_not_cached_because_dashboard_unshared_and_not_recently_accessed.pk
-            ).last_refresh
-        )
-        self.assertIsNone(
-            DashboardTile.objects.get(pk=tile_to_not_cache_because_dashboard_is_access_too_long_ago.pk).last_refresh
+            insights[insight_not_cached_because_dashboard_unshared_and_not_recently_accessed.pk].last_refresh
         )
+        self.assertIsNone(tiles[tile_to_not_cache_because_dashboard_is_access_too_long_ago.pk].last_refresh)
 
-        self.assertIsNotNone(
-            Insight.objects.get(pk=item_cached_because_on_recently_shared_dashboard_with_no_filter.pk).last_refresh
-        )
-        self.assertIsNotNone(
-            DashboardTile.objects.get(pk=tile_to_cache_because_dashboard_was_recently_accessed.pk).last_refresh
-        )
+        self.assertIsNotNone(insights[item_cached_because_on_recently_shared_dashboard_with_no_filter.pk].last_refresh)
+        self.assertIsNotNone(tiles[tile_to_cache_because_dashboard_was_recently_accessed.pk].last_refresh)
 
         self.assertEqual(get_safe_cache(item_key)["result"][0]["count"], 0)
         self.assertEqual(get_safe_cache(funnel_key)["result"][0]["count"], 0)
 
-    @freeze_time("2012-01-15")
     @patch("posthog.caching.update_cache.group.apply_async")
     @patch("posthog.celery.update_cache_item_task.s")
     def test_refresh_dashboard_cache_types(
@@ -345,7 +410,7 @@ class TestUpdateCache(APIBaseTest):
         )
 
         self._test_refresh_dashboard_cache_types(
-            Filter(data={"insight": "TRENDS", "events": [{"id": "$pageview"}]}),
+            Filter(data={"insight": "TRENDS", **_FILTER_PAGEVIEW}),
             CacheType.TRENDS,
             patch_update_cache_item,
             last_refresh=frozen_time,
@@ -369,13 +434,12 @@ class TestUpdateCache(APIBaseTest):
             last_refresh=frozen_time,
         )
 
-    @freeze_time("2012-01-15")
     def test_update_cache_item_calls_right_class(self) -> None:
-        filter = Filter(data={"insight": "TRENDS", "events": [{"id": "$pageview"}]})
+        filter = make_filter({"insight": "TRENDS", **_FILTER_PAGEVIEW})
         insight, _ = self._create_dashboard(filter)
 
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.TRENDS,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -384,7 +448,6 @@ class TestUpdateCache(APIBaseTest):
         self.assertEqual(updated_dashboard_item.refreshing, False)
         self.assertEqual(updated_dashboard_item.last_refresh, now())
 
-    @freeze_time("2012-01-15")
     @patch("posthog.queries.funnels.ClickhouseFunnelUnordered", create=True)
     @patch("posthog.queries.funnels.ClickhouseFunnelStrict", create=True)
     @patch("posthog.caching.calculate_results.ClickhouseFunnelTimeToConvert", create=True)
@@ -415,7 +478,7 @@ class TestUpdateCache(APIBaseTest):
         filter = base_filter
         funnel_mock.return_value.run.return_value = {}
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -427,7 +490,7 @@ class TestUpdateCache(APIBaseTest):
         insight.save()
         funnel_trends_mock.return_value.run.return_value = {}
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -439,7 +502,7 @@ class TestUpdateCache(APIBaseTest):
         insight.save()
         funnel_time_to_convert_mock.return_value.run.return_value = {}
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -451,7 +514,7 @@ class TestUpdateCache(APIBaseTest):
         insight.save()
         funnel_strict_mock.return_value.run.return_value = {}
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -463,7 +526,7 @@ class TestUpdateCache(APIBaseTest):
         insight.save()
         funnel_unordered_mock.return_value.run.return_value = {}
         update_cache_item(
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             CacheType.FUNNEL,
             {"filter": filter.toJSON(), "team_id": self.team.pk},
         )
@@ -481,10 +544,10 @@ class TestUpdateCache(APIBaseTest):
         update_cached_items()
 
         expected_args = [
-            generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk)),
+            cached_filter_key(filter.toJSON(), self.team.pk),
             cache_type,
             {
-                "filter": filter.toJSON(),
+                "filter": filter.to_dict(),
                 "team_id": self.team.pk,
                 "insight_id": insight.id,
                 "dashboard_id": dashboard.id,
@@ -496,30 +559,29 @@ class TestUpdateCache(APIBaseTest):
 
         update_cache_item(*expected_args)
 
-        item_key = generate_cache_key("{}_{}".format(filter.toJSON(), self.team.pk))
+        item_key = cached_filter_key(filter.toJSON(), self.team.pk)
         self.assertIsNotNone(get_safe_cache(item_key))
 
     def _create_dashboard(self, filter: FilterType) -> Tuple[Insight, Dashboard]:
-        dashboard_to_cache = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
+        _now = now()
+        dashboard_to_cache = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=_now)
 
         insight = Insight.objects.create(
-            filters=filter.to_dict(), team=self.team, last_refresh=now() - timedelta(days=30)
+            filters=filter.to_dict(), team=self.team, last_refresh=_now - timedelta(days=30)
         )
         DashboardTile.objects.create(
-            insight=insight, dashboard=dashboard_to_cache, last_refresh=now() - timedelta(days=7)
+            insight=insight, dashboard=dashboard_to_cache, last_refresh=_now - timedelta(days=7)
         )
         return insight, dashboard_to_cache
 
     @patch("posthog.caching.update_cache.group.apply_async")
     @patch("posthog.celery.update_cache_item_task.s")
-    @freeze_time("2012-01-15")
     def test_stickiness_regression(self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock) -> None:
         # We moved Stickiness from being a "shown_as" item to its own insight
         # This move caused issues hence a regression test
         filter_stickiness = StickinessFilter(
             data={
-                "events": [{"id": "$pageview"}],
-                "properties": [{"key": "$browser", "value": "Mac OS X"}],
+                **_FILTER_PAGEVIEW_MAC,
                 "date_from": "2012-01-10",
                 "date_to": "2012-01-15",
                 "insight": INSIGHT_STICKINESS,
@@ -530,8 +592,7 @@ class TestUpdateCache(APIBaseTest):
         )
         filter = Filter(
             data={
-                "events": [{"id": "$pageview"}],
-                "properties": [{"key": "$browser", "value": "Mac OS X"}],
+                **_FILTER_PAGEVIEW_MAC,
                 "date_from": "2012-01-10",
                 "date_to": "2012-01-15",
             }
@@ -542,8 +603,8 @@ class TestUpdateCache(APIBaseTest):
         DashboardTile.objects.create(insight=insight, dashboard=shared_dashboard)
         insight = Insight.objects.create(filters=filter.to_dict(), team=self.team)
         DashboardTile.objects.create(insight=insight, dashboard=shared_dashboard)
-        item_stickiness_key = generate_cache_key(filter_stickiness.toJSON() + "_" + str(self.team.pk))
-        item_key = generate_cache_key(filter.toJSON() + "_" + str(self.team.pk))
+        item_stickiness_key = cached_filter_key(filter_stickiness.toJSON(), self.team.pk)
+        item_key = cached_filter_key(filter.toJSON(), self.team.pk)
 
         run_cache_update(patch_update_cache_item)
 
@@ -565,8 +626,8 @@ class TestUpdateCache(APIBaseTest):
         with freeze_time("2021-08-25T22:09:14.252Z") as frozen_datetime:
             dashboard_to_cache = create_shared_dashboard(team=self.team, is_shared=True, last_accessed_at=now())
             item_to_cache = Insight.objects.create(
-                filters=Filter(
-                    data={"events": [{"id": "$pageview"}], "properties": [{"key": "$browser", "value": "Mac OS X"}]}
+                filters=make_filter(
+                    _FILTER_PAGEVIEW_MAC
                 ).to_dict(),
                 team=self.team,
             )
@@ -574,26 +635,22 @@ class TestUpdateCache(APIBaseTest):
 
             patch_calculate_by_filter.side_effect = Exception()
 
-            def _update_cached_items() -> None:
-                # This function will throw an exception every time which is what we want in production
-                try:
-                    update_cached_items()
-                except Exception:
-                    pass
-
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, 1)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 1)
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, 2)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 2)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, 1)
+            self.assertEqual(tile.refresh_attempt, 1)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, 2)
+            self.assertEqual(tile.refresh_attempt, 2)
 
             # Magically succeeds, reset counter
             patch_calculate_by_filter.side_effect = None
             patch_calculate_by_filter.return_value = {"some": "exciting results"}
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, 0)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 0)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, 0)
+            self.assertEqual(tile.refresh_attempt, 0)
 
             # tick forwards since we ignore recently refreshed tiles
             frozen_datetime.tick(timedelta(minutes=4))
@@ -601,19 +658,19 @@ class TestUpdateCache(APIBaseTest):
             # We should retry a max of 3 times
             patch_calculate_by_filter.reset_mock()
             patch_calculate_by_filter.side_effect = Exception()
-            _update_cached_items()
-            _update_cached_items()
-            _update_cached_items()
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, 3)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 3)
+            for _ in range(4):
+                _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, 3)
+            self.assertEqual(tile.refresh_attempt, 3)
             self.assertEqual(patch_calculate_by_filter.call_count, 3)
 
             # If a user later comes back and manually refreshes we should reset refresh_attempt
             patch_calculate_by_filter.side_effect = None
             self.client.get(f"/api/projects/{self.team.pk}/insights/{item_to_cache.pk}/?refresh=true")
-            self.assertEqual(Insight.objects.get().refresh_attempt, 0)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 0)
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, 0)
+            self.assertEqual(tile.refresh_attempt, 0)
 
     @patch("posthog.caching.calculate_results._calculate_by_filter")
     def test_errors_refreshing_dashboard_tile(self, patch_calculate_by_filter: MagicMock) -> None:
@@ -626,8 +683,8 @@ class TestUpdateCache(APIBaseTest):
                 team=self.team, is_shared=True, last_accessed_at=now(), filters={"date_from": "-14d"}
             )
             item_to_cache = Insight.objects.create(
-                filters=Filter(
-                    data={"events": [{"id": "$pageview"}], "properties": [{"key": "$browser", "value": "Mac OS X"}]}
+                filters=make_filter(
+                    _FILTER_PAGEVIEW_MAC
                 ).to_dict(),
                 team=self.team,
             )
@@ -635,47 +692,43 @@ class TestUpdateCache(APIBaseTest):
 
             patch_calculate_by_filter.side_effect = Exception()
 
-            def _update_cached_items() -> None:
-                # This function will throw an exception every time which is what we want in production
-                try:
-                    update_cached_items()
-                except Exception:
-                    pass
-
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, None)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 1)
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, None)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 2)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, None)
+            self.assertEqual(tile.refresh_attempt, 1)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, None)
+            self.assertEqual(tile.refresh_attempt, 2)
 
             # Magically succeeds, reset counter
             patch_calculate_by_filter.side_effect = None
             patch_calculate_by_filter.return_value = {"some": "exciting results"}
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, None)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 0)
+            _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, None)
+            self.assertEqual(tile.refresh_attempt, 0)
 
             # tick forwards since we ignore recently refreshed tiles
             frozen_datetime.tick(timedelta(minutes=4))
             # We should retry a max of 3 times
             patch_calculate_by_filter.reset_mock()
             patch_calculate_by_filter.side_effect = Exception()
-            _update_cached_items()
-            _update_cached_items()
-            _update_cached_items()
-            _update_cached_items()
-            self.assertEqual(Insight.objects.get().refresh_attempt, None)
+            for _ in range(4):
+                _update_cached_items_ignoring_errors()
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, None)
             self.assertEqual(patch_calculate_by_filter.call_count, 3)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 3)
+            self.assertEqual(tile.refresh_attempt, 3)
 
             # If a user later comes back and manually refreshes we should reset refresh_attempt
             patch_calculate_by_filter.side_effect = None
             self.client.get(
                 f"/api/projects/{self.team.pk}/insights/{item_to_cache.pk}/?refresh=true&from_dashboard={dashboard_to_cache.id}"
             )
-            self.assertEqual(Insight.objects.get().refresh_attempt, None)
-            self.assertEqual(DashboardTile.objects.get().refresh_attempt, 0)
+            tile = _tile_with_insight()
+            self.assertEqual(tile.insight.refresh_attempt, None)
+            self.assertEqual(tile.refresh_attempt, 0)
 
     @freeze_time("2021-08-25T22:09:14.252Z")
     def test_filters_multiple_dashboard(self) -> None:
@@ -688,10 +741,8 @@ class TestUpdateCache(APIBaseTest):
         )
         dashboard_no_filter: Dashboard = create_shared_dashboard(team=self.team, is_shared=True)
 
-        filter = {"events": [{"id": "$pageview"}]}
-        filters_hash_with_no_dashboard = generate_cache_key(
-            "{}_{}".format(get_filter(data=filter, team=self.team).toJSON(), self.team.id)
-        )
+        filter = dict(_FILTER_PAGEVIEW)
+        filters_hash_with_no_dashboard = cached_filter_key(get_filter(data=filter, team=self.team).toJSON(), self.team.id)
 
         item1 = Insight.objects.create(filters=filter, team=self.team)
         self.assertEqual(item1.filters_hash, filters_hash_with_no_dashboard)
@@ -710,33 +761,23 @@ class TestUpdateCache(APIBaseTest):
 
         update_cached_items()
 
-        self._assert_number_of_days_in_results(
-            DashboardTile.objects.get(insight=item1, dashboard=dashboard_14_days), number_of_days_in_results=15
-        )
-
-        self._assert_number_of_days_in_results(
-            DashboardTile.objects.get(insight=item2, dashboard=dashboard_30_days), number_of_days_in_results=31
-        )
-        self._assert_number_of_days_in_results(
-            DashboardTile.objects.get(insight=item3, dashboard=dashboard_no_filter), number_of_days_in_results=8
-        )
+        expected = [(item1, dashboard_14_days, 15), (item2, dashboard_30_days, 31), (item3, dashboard_no_filter, 8)]
+        # one SELECT for all three tiles instead of a get() per assertion
+        tiles = {
+            (tile.insight_id, tile.dashboard_id): tile
+            for tile in DashboardTile.objects.filter(insight__in=[insight.pk for insight, _, _ in expected])
+        }
+        for insight, dashboard, number_of_days in expected:
+            with self.subTest(insight=insight.pk, dashboard=dashboard.pk):
+                _assert_number_of_days_in_results(
+                    tiles[(insight.pk, dashboard.pk)], number_of_days_in_results=number_of_days
+                )
 
-        self.assertEqual(
-            Insight.objects.all().order_by("id")[0].last_refresh.isoformat(), "2021-08-25T22:09:14.252000+00:00"
-        )
-        self.assertEqual(
-            Insight.objects.all().order_by("id")[1].last_refresh.isoformat(), "2021-08-25T22:09:14.252000+00:00"
-        )
-        self.assertEqual(
-            Insight.objects.all().order_by("id")[2].last_refresh.isoformat(), "2021-08-25T22:09:14.252000+00:00"
-        )
+        # one SELECT instead of three LIMIT/OFFSET queries
+        for insight in Insight.objects.order_by("id"):
+            self.assertEqual(insight.last_refresh.isoformat(), "2021-08-25T22:09:14.252000+00:00")
 
-    def _assert_number_of_days_in_results(self, dashboard_tile: DashboardTile, number_of_days_in_results: int) -> None:
-        cache_result = get_safe_cache(dashboard_tile.filters_hash)
-        number_of_results = len(cache_result["result"][0]["data"])
-        self.assertEqual(number_of_results, number_of_days_in_results)
 
-    @freeze_time("2021-08-25T22:09:14.252Z")
     @patch("posthog.caching.update_cache.insight_update_task_params")
     def test_broken_insights(self, dashboard_item_update_task_params: MagicMock) -> None:
         # sometimes we have broken insights, add a test to catch
@@ -744,21 +785,28 @@ class TestUpdateCache(APIBaseTest):
         item = Insight.objects.create(filters={}, team=self.team)
         DashboardTile.objects.create(insight=item, dashboard=dashboard)
 
-        update_cached_items()
+        with fake_now(datetime(2021, 8, 25, 22, 9, 14, tzinfo=pytz.utc)):
+            with CaptureQueriesContext(connection) as scheduling_queries:
+                update_cached_items()
 
         self.assertEqual(dashboard_item_update_task_params.call_count, 0)
+        # regression guard: scheduling a run should cost a fixed handful of queries,
+        # not grow with the number of candidate tiles
+        self.assertLessEqual(len(scheduling_queries.captured_queries), 25)
 
     @patch("posthog.caching.update_cache.insight_update_task_params")
     def test_broken_exception_insights(self, dashboard_item_update_task_params: MagicMock) -> None:
         dashboard_item_update_task_params.side_effect = Exception()
         dashboard = create_shared_dashboard(team=self.team, is_shared=True)
-        filter = {"events": [{"id": "$pageview"}]}
+        filter = dict(_FILTER_PAGEVIEW)
         item = Insight.objects.create(filters=filter, team=self.team)
         DashboardTile.objects.create(insight=item, dashboard=dashboard)
 
-        update_cached_items()
+        with CaptureQueriesContext(connection) as scheduling_queries:
+            update_cached_items()
 
         self.assertEquals(Insight.objects.get().refresh_attempt, 1)
+        self.assertLessEqual(len(scheduling_queries.captured_queries), 25)
 
     @patch("posthog.caching.update_cache.group.apply_async")
     @patch("posthog.celery.update_cache_item_task.s")
@@ -766,10 +814,7 @@ class TestUpdateCache(APIBaseTest):
     def test_refresh_insight_cache(self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock) -> None:
         parallel_insight_cache = 5
         set_instance_setting(key="PARALLEL_INSIGHT_CACHE", value=parallel_insight_cache)
-        filter_dict: Dict[str, Any] = {
-            "events": [{"id": "$pageview"}],
-            "properties": [{"key": "$browser", "value": "Mac OS X"}],
-        }
+        filter_dict: Dict[str, Any] = dict(_FILTER_PAGEVIEW_MAC)
 
         shared_insight = create_shared_insight(team=self.team, is_enabled=True, filters=filter_dict)
         shared_insight_without_filters = create_shared_insight(team=self.team, is_enabled=True, filters={})
@@ -777,34 +822,30 @@ class TestUpdateCache(APIBaseTest):
         shared_insight_refreshing = create_shared_insight(team=self.team, is_enabled=True, refreshing=True)
 
         # Valid insights within the PARALLEL_INSIGHT_CACHE count
-        other_insights_in_range = [
-            create_shared_insight(
-                team=self.team,
-                is_enabled=True,
-                filters=filter_dict,
-                last_refresh=datetime(2022, 1, 1).replace(tzinfo=pytz.utc),
-            )
-            for _ in range(parallel_insight_cache - 1)
-        ]
+        other_insights_in_range = bulk_create_shared_insights(
+            self.team,
+            parallel_insight_cache - 1,
+            filters=filter_dict,
+            last_refresh=datetime(2022, 1, 1).replace(tzinfo=pytz.utc),
+        )
 
         # Valid insights outside of the PARALLEL_INSIGHT_CACHE count with later refresh date to ensure order
-        other_insights_out_of_range = [
-            create_shared_insight(
-                team=self.team,
-                is_enabled=True,
-                filters=filter_dict,
-                last_refresh=datetime(2022, 1, 2).replace(tzinfo=pytz.utc),
-            )
-            for i in range(5)
-        ]
+        other_insights_out_of_range = bulk_create_shared_insights(
+            self.team,
+            5,
+            filters=filter_dict,
+            last_refresh=datetime(2022, 1, 2).replace(tzinfo=pytz.utc),
+        )
 
         tasks, queue_length = update_cached_items()
 
         assert tasks == 5
         assert queue_length == parallel_insight_cache + 5
 
-        for call_item in patch_update_cache_item.call_args_list:
-            update_cache_item(*call_item[0])
+        # run the dispatched tasks in one transaction so the insight updates commit together
+        with transaction.atomic():
+            for call_item in patch_update_cache_item.call_args_list:
+                update_cache_item(*call_item[0])
 
         assert Insight.objects.get(pk=shared_insight.pk).last_refresh
         assert not Insight.objects.get(pk=shared_insight_without_filters.pk).last_refresh
@@ -827,16 +868,13 @@ class TestUpdateCache(APIBaseTest):
         assert insight.refresh_attempt is None
         assert tile.refresh_attempt is None
 
-        filter_dict: Dict[str, Any] = {
-            "events": [{"id": "$pageview"}],
-            "properties": [{"key": "$browser", "value": "Mac OS X"}],
-        }
+        filter_dict: Dict[str, Any] = dict(_FILTER_PAGEVIEW_MAC)
 
         update_cache_item(
             key="a key that does not match",
             cache_type=CacheType.TRENDS,
             payload={
-                "filter": Filter(data=filter_dict).toJSON(),
+                "filter": make_filter(filter_dict).toJSON(),
                 "team_id": self.team.id,
                 "insight_id": insight.id,
                 "dashboard_id": dashboard.id,
@@ -855,16 +893,13 @@ class TestUpdateCache(APIBaseTest):
 
         assert insight.refresh_attempt is None
 
-        filter_dict: Dict[str, Any] = {
-            "events": [{"id": "$pageview"}],
-            "properties": [{"key": "$browser", "value": "Mac OS X"}],
-        }
+        filter_dict: Dict[str, Any] = dict(_FILTER_PAGEVIEW_MAC)
 
         update_cache_item(
             key="a key that does not match",
             cache_type=CacheType.TRENDS,
             payload={
-                "filter": Filter(data=filter_dict).toJSON(),
+                "filter": make_filter(filter_dict).toJSON(),
                 "team_id": self.team.id,
                 "insight_id": insight.id,
                 "dashboard_id": None,
@@ -877,7 +912,7 @@ class TestUpdateCache(APIBaseTest):
     @patch("posthog.caching.update_cache.statsd.gauge")
     def test_never_refreshed_tiles_are_gauged(self, statsd_gauge: MagicMock) -> None:
         dashboard = create_shared_dashboard(team=self.team, is_shared=True)
-        filter = {"events": [{"id": "$pageview"}]}
+        filter = dict(_FILTER_PAGEVIEW)
         item = Insight.objects.create(filters=filter, team=self.team)
         tile: DashboardTile = DashboardTile.objects.create(insight=item, dashboard=dashboard)
 
@@ -890,8 +925,9 @@ class TestUpdateCache(APIBaseTest):
     @freeze_time("2022-12-01T13:54:00.000Z")
     @patch("posthog.caching.update_cache.statsd.gauge")
     def test_refresh_age_of_tiles_is_gauged(self, statsd_gauge: MagicMock) -> None:
-        tile_one = _a_dashboard_tile_with_known_last_refresh(self.team, datetime.now(pytz.utc) - timedelta(hours=1))
-        tile_two = _a_dashboard_tile_with_known_last_refresh(self.team, datetime.now(pytz.utc) - timedelta(hours=0.5))
+        utc_now = datetime.now(pytz.utc)
+        tile_one = _a_dashboard_tile_with_known_last_refresh(self.team, utc_now - timedelta(hours=1))
+        tile_two = _a_dashboard_tile_with_known_last_refresh(self.team, utc_now - timedelta(hours=0.5))
 
         # should not gauge because no last_refresh
         _a_dashboard_tile_with_known_last_refresh(self.team, None)
@@ -919,12 +955,7 @@ class TestUpdateCache(APIBaseTest):
         )
 
         # the tile with no last refresh isn't gauged for lag
-        lag_calls = [
-            x.args[0]
-            for x in statsd_gauge.mock_calls
-            if len(x.args) > 0 and x.args[0] == "update_cache_queue.dashboards_lag"
-        ]
-        assert len(lag_calls) == 2
+        assert _count_gauge_calls(statsd_gauge, "update_cache_queue.dashboards_lag") == 2
 
     @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "None"})
     @patch("posthog.caching.update_cache.group.apply_async")
@@ -933,39 +964,42 @@ class TestUpdateCache(APIBaseTest):
         self, patch_update_cache_item: MagicMock, _patch_apply_async: MagicMock, _patch_generate_results: MagicMock
     ) -> None:
 
-        with freeze_time("2021-08-25T22:09:14.252Z") as frozen_datetime:
-            # two tiles that share a hash
-            # only one on a shared dashboard
-            # the dashboard has no filters so both insights and the tile share a hash key
-            insight_one = _create_insight_with_known_cache_key(self.team, None)
-            insight_two = _create_insight_with_known_cache_key(self.team, None)
-            dashboard, tile = _create_dashboard_tile_with_known_cache_key(
-                self.team, insight_one, None, last_accessed_at=datetime.now(pytz.utc)
-            )
+        # every write in the scheduler and reporting goes through timezone.now, so two
+        # discrete pinned datetimes replace the freeze_time block and its tick()
+        first_run_at = datetime(2021, 8, 25, 22, 9, 14, 252000, tzinfo=pytz.utc)
 
-            run_cache_update(patch_update_cache_item)
+        # two tiles that share a hash
+        # only one on a shared dashboard
+        # the dashboard has no filters so both insights and the tile share a hash key
+        insight_one = _create_insight_with_known_cache_key(self.team, None)
+        insight_two = _create_insight_with_known_cache_key(self.team, None)
+        dashboard, tile = _create_dashboard_tile_with_known_cache_key(
+            self.team, insight_one, None, last_accessed_at=first_run_at
+        )
 
-            tile.refresh_from_db()
-            insight_one.refresh_from_db()
-            insight_two.refresh_from_db()
+        with fake_now(first_run_at):
+            run_cache_update(patch_update_cache_item)
 
-            assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
-            assert insight_one.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
-            assert insight_two.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        tile.refresh_from_db()
+        insight_one.refresh_from_db()
+        insight_two.refresh_from_db()
 
-            frozen_datetime.tick(delta=timedelta(minutes=1))
+        assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        assert insight_one.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        assert insight_two.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
 
-            patch_update_cache_item.reset_mock()
+        patch_update_cache_item.reset_mock()
+        with fake_now(first_run_at + timedelta(minutes=1)):
             run_cache_update(patch_update_cache_item)
 
-            # refresh dates don't change
-            tile.refresh_from_db()
-            insight_one.refresh_from_db()
-            insight_two.refresh_from_db()
+        # refresh dates don't change
+        tile.refresh_from_db()
+        insight_one.refresh_from_db()
+        insight_two.refresh_from_db()
 
-            assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
-            assert insight_one.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
-            assert insight_two.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        assert insight_one.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
+        assert insight_two.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
 
     @freeze_time("2021-08-25T22:09:14.252Z")
     @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not", "an empty result"})
@@ -1053,116 +1087,99 @@ class TestUpdateCache(APIBaseTest):
         assert tile.last_refresh.isoformat() == "2021-08-25T22:09:14.252000+00:00"
 
 
+@pytest.mark.usefixtures("redis_recency")
 class TestUpdateCacheForSharedInsights(APIBaseTest):
-    @fixture(scope="class", autouse=True)
-    def redis_recency(self) -> Generator[List[int], None, None]:
-        """The current team is always recent for these tests"""
-        with patch("posthog.caching.utils.get_client") as mock_redis_get_client:
-            recent_teams = [(self.team.id, 1)]
-            mock_redis_get_client.return_value.zrange.return_value = recent_teams
-
-            yield [i for i, _ in recent_teams]
-
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_updates_insight_with_incorrect_filters_hash(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        _patch_generate_results: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        # enter the four patches once for the whole class instead of once per test
+        stack = ExitStack()
+        cls.patch_update_cache_item = stack.enter_context(patch("posthog.celery.update_cache_item_task.s"))
+        stack.enter_context(patch("posthog.caching.update_cache.group.apply_async"))
+        cls.patch_calculate_by_filter = stack.enter_context(
+            patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
+        )
+        stack.enter_context(patch("posthog.caching.update_cache.cache.set"))
+        cls.addClassCleanup(stack.close)
+
+    def setUp(self) -> None:
+        super().setUp()
+        # call records must not leak between tests
+        self.patch_update_cache_item.reset_mock()
+        self.patch_calculate_by_filter.reset_mock()
+
+    def test_updates_insight_with_incorrect_filters_hash(self) -> None:
         test_hash = "ma räägin temaga, aga vaatan sind"
         insight = _create_insight_with_known_cache_key(self.team, test_hash)
         SharingConfiguration.objects.create(team=self.team, insight=insight, enabled=True)
 
-        run_cache_update(patch_update_cache_item)
-        insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        assert insight.filters_hash != test_hash
-        assert insight.last_refresh is not None
+        fetched = fetch_fields(Insight, insight.pk, "filters_hash", "last_refresh")
+        assert fetched["filters_hash"] != test_hash
+        assert fetched["last_refresh"] is not None
 
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_updates_insight_with_null_filters_hash(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        _patch_generate_results: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
+    def test_updates_insight_with_null_filters_hash(self) -> None:
 
         insight = _create_insight_with_known_cache_key(self.team, None)
         SharingConfiguration.objects.create(team=self.team, insight=insight, enabled=True)
 
-        run_cache_update(patch_update_cache_item)
-        insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        assert insight.filters_hash is not None
-        assert insight.last_refresh is not None
+        fetched = fetch_fields(Insight, insight.pk, "filters_hash", "last_refresh")
+        assert fetched["filters_hash"] is not None
+        assert fetched["last_refresh"] is not None
 
 
+@pytest.mark.usefixtures("redis_recency")
 class TestCacheEventsLastSeenUsedToSkipQueries(APIBaseTest):
-    @fixture(scope="class", autouse=True)
-    def redis_recency(self) -> Generator[List[int], None, None]:
-        """The current team is always recent for these tests"""
-        with patch("posthog.caching.utils.get_client") as mock_redis_get_client:
-            recent_teams = [(self.team.id, 1)]
-            mock_redis_get_client.return_value.zrange.return_value = recent_teams
-
-            yield [i for i, _ in recent_teams]
-
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_events_not_recently_ingested_are_not_queried(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        patch_calculate_by_filter: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
-        shared_insight = create_shared_insight(
-            self.team,
-            is_enabled=True,
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        # enter the four patches once for the whole class instead of once per test
+        stack = ExitStack()
+        cls.patch_update_cache_item = stack.enter_context(patch("posthog.celery.update_cache_item_task.s"))
+        stack.enter_context(patch("posthog.caching.update_cache.group.apply_async"))
+        cls.patch_calculate_by_filter = stack.enter_context(
+            patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
+        )
+        stack.enter_context(patch("posthog.caching.update_cache.cache.set"))
+        cls.addClassCleanup(stack.close)
+
+    def setUp(self) -> None:
+        super().setUp()
+        # call records must not leak between tests
+        self.patch_update_cache_item.reset_mock()
+        self.patch_calculate_by_filter.reset_mock()
+
+    def _shared_insight(self, filters: Dict[str, Any], last_refresh: datetime) -> Insight:
+        """Every test in this class wants the same shape: an enabled shared insight refreshed a while ago."""
+        return create_shared_insight(self.team, is_enabled=True, filters=filters, last_refresh=last_refresh)
+
+    def _define_events(self, *events: Tuple[str, datetime]) -> None:
+        EventDefinition.objects.bulk_create(
+            [EventDefinition(team=self.team, name=name, last_seen_at=last_seen_at) for name, last_seen_at in events]
+        )
+
+    def test_events_not_recently_ingested_are_not_queried(self) -> None:
+        utc_now = datetime.now(pytz.utc)
+        shared_insight = self._shared_insight(
             filters={"events": [{"id": "$pageview-on-shared-insight"}]},
-            last_refresh=datetime.now(pytz.utc) - timedelta(days=6),
+            last_refresh=utc_now - timedelta(days=6),
         )
-        SharingConfiguration.objects.create(team=self.team, insight=shared_insight, enabled=True)
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="$pageview-on-shared-insight",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=7),
-        )
+        self._define_events(("$pageview-on-shared-insight", utc_now - timedelta(days=7)))
 
-        run_cache_update(patch_update_cache_item)
-        shared_insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        patch_calculate_by_filter.assert_not_called()
+        self.patch_calculate_by_filter.assert_not_called()
 
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_trends_with_actions_are_always_queried(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        patch_calculate_by_filter: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
+    def test_trends_with_actions_are_always_queried(self) -> None:
         # the event has not been received since the last refresh of the item
         # but the actions in the filter mean we don't know if the cache is valid
 
-        shared_insight = create_shared_insight(
-            self.team,
-            is_enabled=True,
+        utc_now = datetime.now(pytz.utc)
+        shared_insight = self._shared_insight(
             filters={
                 "events": [{"id": "$pageview", "name": "$pageview", "type": "events", "order": 2}],
                 "actions": [
@@ -1173,35 +1190,18 @@ class TestCacheEventsLastSeenUsedToSkipQueries(APIBaseTest):
                 "insight": "TRENDS",
                 "interval": "day",
             },
-            last_refresh=datetime.now(pytz.utc) - timedelta(days=6),
+            last_refresh=utc_now - timedelta(days=6),
         )
-        SharingConfiguration.objects.create(team=self.team, insight=shared_insight, enabled=True)
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="$pageview",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=7),
-        )
+        self._define_events(("$pageview", utc_now - timedelta(days=7)))
 
-        run_cache_update(patch_update_cache_item)
-        shared_insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        patch_calculate_by_filter.assert_any_call(ANY, self.team, "Trends")
+        self.patch_calculate_by_filter.assert_any_call(ANY, self.team, "Trends")
 
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_events_not_recently_ingested_are_always_queried_for_retention_insight(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        patch_calculate_by_filter: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
-        shared_insight = create_shared_insight(
-            self.team,
-            is_enabled=True,
+    def test_events_not_recently_ingested_are_always_queried_for_retention_insight(self) -> None:
+        utc_now = datetime.now(pytz.utc)
+        shared_insight = self._shared_insight(
             filters={
                 "period": "Week",
                 "insight": "RETENTION",
@@ -1209,40 +1209,20 @@ class TestCacheEventsLastSeenUsedToSkipQueries(APIBaseTest):
                 "retention_type": "retention_first_time",
                 "returning_entity": {"id": "$pageview-finish", "type": "events"},
             },
-            last_refresh=datetime.now(pytz.utc) - timedelta(days=6),
+            last_refresh=utc_now - timedelta(days=6),
         )
-        SharingConfiguration.objects.create(team=self.team, insight=shared_insight, enabled=True)
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="$pageview-start",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=7),
-        )
-        EventDefinition.objects.create(
-            team=self.team,
-            name="$pageview-finish",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=7),
+        self._define_events(
+            ("$pageview-start", utc_now - timedelta(days=7)), ("$pageview-finish", utc_now - timedelta(days=7))
         )
 
-        run_cache_update(patch_update_cache_item)
-        shared_insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        patch_calculate_by_filter.assert_any_call(ANY, self.team, "Retention")
+        self.patch_calculate_by_filter.assert_any_call(ANY, self.team, "Retention")
 
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_events_not_recently_ingested_are_always_queried_for_paths_insight(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        patch_calculate_by_filter: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
-        shared_insight = create_shared_insight(
-            self.team,
-            is_enabled=True,
+    def test_events_not_recently_ingested_are_always_queried_for_paths_insight(self) -> None:
+        utc_now = datetime.now(pytz.utc)
+        shared_insight = self._shared_insight(
             filters={
                 "insight": "PATHS",
                 "properties": [],
@@ -1254,58 +1234,32 @@ class TestCacheEventsLastSeenUsedToSkipQueries(APIBaseTest):
                 "include_event_types": ["$pageview"],
                 "local_path_cleaning_filters": [],
             },
-            last_refresh=datetime.now(pytz.utc) - timedelta(days=6),
+            last_refresh=utc_now - timedelta(days=6),
         )
-        SharingConfiguration.objects.create(team=self.team, insight=shared_insight, enabled=True)
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="$pageview",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=7),
-        )
+        self._define_events(("$pageview", utc_now - timedelta(days=7)))
 
-        run_cache_update(patch_update_cache_item)
-        shared_insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        patch_calculate_by_filter.assert_any_call(ANY, self.team, "Path")
+        self.patch_calculate_by_filter.assert_any_call(ANY, self.team, "Path")
 
-    @patch("posthog.caching.update_cache.cache.set")
-    @patch("posthog.caching.calculate_results._calculate_by_filter", return_value={"not": "empty result"})
-    @patch("posthog.caching.update_cache.group.apply_async")
-    @patch("posthog.celery.update_cache_item_task.s")
-    def test_only_one_of_several_events_not_recently_ingested_still_runs_cache_update(
-        self,
-        patch_update_cache_item: MagicMock,
-        _patch_apply_async: MagicMock,
-        patch_calculate_by_filter: MagicMock,
-        _patched_cache_set: MagicMock,
-    ) -> None:
-        shared_insight = create_shared_insight(
-            self.team,
-            is_enabled=True,
+    def test_only_one_of_several_events_not_recently_ingested_still_runs_cache_update(self) -> None:
+        utc_now = datetime.now(pytz.utc)
+        shared_insight = self._shared_insight(
             filters={
                 "events": [{"id": "unseen-$pageview-on-shared-insight"}, {"id": "seen-$pageview-on-shared-insight"}]
             },
-            last_refresh=datetime.now(pytz.utc) - timedelta(days=6),
+            last_refresh=utc_now - timedelta(days=6),
         )
-        SharingConfiguration.objects.create(team=self.team, insight=shared_insight, enabled=True)
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="unseen-$pageview-on-shared-insight",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=100),
+        self._define_events(
+            ("unseen-$pageview-on-shared-insight", utc_now - timedelta(days=100)),
+            ("seen-$pageview-on-shared-insight", utc_now - timedelta(days=1)),
         )
 
-        EventDefinition.objects.create(
-            team=self.team,
-            name="seen-$pageview-on-shared-insight",
-            last_seen_at=datetime.now(pytz.utc) - timedelta(days=1),
-        )
-
-        run_cache_update(patch_update_cache_item)
-        shared_insight.refresh_from_db()
+        run_cache_update(self.patch_update_cache_item)
 
-        patch_calculate_by_filter.assert_any_call(ANY, self.team, "Trends")
+        self.patch_calculate_by_filter.assert_any_call(ANY, self.team, "Trends")
 
 
 class TestCacheTeamRecency(APIBaseTest):
@@ -1,5 +1,7 @@
 import datetime
 import json
+import time
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import structlog
@@ -8,8 +10,10 @@ from celery.canvas import Signature
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
 from django.db.models.expressions import F
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
 from django.utils import timezone
 from sentry_sdk import capture_exception
@@ -32,15 +36,50 @@ from posthog.utils import generate_cache_key
 
 logger = structlog.get_logger(__name__)
 
+# team rows barely change between the tasks of a beat tick; hold fetched teams
+# in-process briefly so up to 2*PARALLEL_INSIGHT_CACHE tasks share one SELECT
+TEAM_CACHE_TTL_SECONDS = 60
+
+# above this size a WHERE team_id IN (...) clause costs the planner more than it
+# prunes; if the recent set turns out to cover every team, drop the clause instead
+LARGE_TEAM_FILTER_THRESHOLD = 200
+
+_team_cache: Dict[int, Tuple[float, Team]] = {}
+
+
+def _team_for_cache_update(team_id: int) -> Team:
+    cached = _team_cache.get(team_id)
+    if cached is not None and time.monotonic() - cached[0] < TEAM_CACHE_TTL_SECONDS:
+        return cached[1]
+    team = Team.objects.get(pk=team_id)
+    _team_cache[team_id] = (time.monotonic(), team)
+    return team
+
+
+@lru_cache(maxsize=1024)
+def _insight_cache_key(filter_json: str, team_id: int) -> str:
+    """Serializing and hashing a filter is pure, so repeat candidates can reuse the digest.
+
+    Keyed on the serialized filter itself, the memo can never go stale when an
+    insight or its dashboard's filters change."""
+    return generate_cache_key("{}_{}".format(filter_json, team_id))
+
 
 def update_cached_items() -> Tuple[int, int]:
     PARALLEL_INSIGHT_CACHE = get_instance_setting("PARALLEL_DASHBOARD_ITEM_CACHE")
     recent_teams = active_teams()
 
+    every_team_is_recent = len(recent_teams) >= LARGE_TEAM_FILTER_THRESHOLD and recent_teams >= set(
+        Team.objects.values_list("id", flat=True)
+    )
+    tiles_team_scope = Q() if every_team_is_recent else Q(insight__team_id__in=recent_teams)
+    insights_team_scope = Q() if every_team_is_recent else Q(team_id__in=recent_teams)
+
     tasks: List[Optional[Signature]] = []
+    failures: List[Tuple[Union[DashboardTile, Insight], Exception]] = []
 
     dashboard_tiles = (
-        DashboardTile.objects.filter(insight__team_id__in=recent_teams)
+        DashboardTile.objects.filter(tiles_team_scope)
         .filter(
             Q(dashboard__sharingconfiguration__enabled=True)
             | Q(dashboard__last_accessed_at__gt=timezone.now() - relativedelta(days=7))
@@ -50,39 +89,58 @@ def update_cached_items() -> Tuple[int, int]:
             Q(last_refresh__isnull=True)
             | Q(last_refresh__lt=timezone.now() - relativedelta(minutes=3))
         )
-        .exclude(dashboard__deleted=True)
-        .exclude(insight__deleted=True)
+        # deleted flags are non-nullable, so positive filters match the excludes exactly;
+        # the tile's refreshing/refresh_attempt are nullable and must stay as excludes
+        .filter(dashboard__deleted=False, insight__deleted=False)
         .exclude(insight__filters={})
         .exclude(refreshing=True)
         .exclude(refresh_attempt__gt=2)
         .select_related("insight", "dashboard")
+        # task construction reads a handful of columns; skip the wide ones
+        # (insight descriptions, dashboard layouts, ...) on this hot queryset
+        .only(
+            "last_refresh",
+            "refresh_attempt",
+            "filters_hash",
+            "insight",
+            "dashboard",
+            "insight__team",
+            "insight__filters",
+            "insight__filters_hash",
+            "insight__refresh_attempt",
+            "insight__last_refresh",
+            "dashboard__filters",
+        )
         .order_by(F("last_refresh").asc(nulls_first=True), F("refresh_attempt").asc())
     )
 
     for dashboard_tile in dashboard_tiles[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(dashboard_tile))
+        tasks.append(task_for_cache_update_candidate(dashboard_tile, failures))
 
     shared_insights = (
-        Insight.objects.filter(team_id__in=recent_teams)
-        .filter(sharingconfiguration__enabled=True)
-        .exclude(deleted=True)
+        Insight.objects.filter(insights_team_scope)
+        .filter(sharingconfiguration__enabled=True, deleted=False, refreshing=False)
         .exclude(filters={})
-        .exclude(refreshing=True)
         .exclude(refresh_attempt__gt=2)
+        .only("team", "filters", "filters_hash", "refresh_attempt", "last_refresh")
         .order_by(F("last_refresh").asc(nulls_first=True))
     )
 
     for insight in shared_insights[0:PARALLEL_INSIGHT_CACHE]:
-        tasks.append(task_for_cache_update_candidate(insight))
+        tasks.append(task_for_cache_update_candidate(insight, failures))
 
-    gauge_cache_update_candidates(dashboard_tiles, shared_insights)
+    _record_candidate_failures(failures)
+
+    tiles_count, insights_count = gauge_cache_update_candidates(dashboard_tiles, shared_insights)
 
     tasks = list(filter(None, tasks))
     group(tasks).apply_async()
-    return len(tasks), dashboard_tiles.count() + shared_insights.count()
+    return len(tasks), tiles_count + insights_count
 
 
-def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) -> Optional[Signature]:
+def task_for_cache_update_candidate(
+    candidate: Union[DashboardTile, Insight], failures: List[Tuple[Union[DashboardTile, Insight], Exception]]
+) -> Optional[Signature]:
     candidate_tile: Optional[DashboardTile] = None if isinstance(candidate, Insight) else candidate
     candidate_insight: Optional[Insight] = candidate if isinstance(candidate, Insight) else candidate.insight
     if candidate_insight is None:
@@ -102,21 +160,56 @@ def task_for_cache_update_candidate(candidate: Union[DashboardTile, Insight]) ->
         update_filters_hash(cache_key, candidate_dashboard, candidate_insight)
         return update_cache_item_task.s(cache_key, cache_type, payload)
     except Exception as e:
-        candidate_insight.refresh_attempt = (candidate_insight.refresh_attempt or 0) + 1
-        candidate_insight.save(update_fields=["refresh_attempt"])
-        if candidate_tile:
-            candidate_tile.refresh_attempt = (candidate_tile.refresh_attempt or 0) + 1
-            candidate_tile.save(update_fields=["refresh_attempt"])
-        capture_exception(e)
+        failures.append((candidate, e))
         return None
 
 
-def gauge_cache_update_candidates(dashboard_tiles: QuerySet, shared_insights: QuerySet) -> None:
-    statsd.gauge(
-        "update_cache_queue.never_refreshed", dashboard_tiles.exclude(insight=None).filter(last_refresh=None).count()
+def _record_candidate_failures(failures: List[Tuple[Union[DashboardTile, Insight], Exception]]) -> None:
+    """Bulk the refresh_attempt accounting so a mass failure costs two UPDATEs, not two per candidate."""
+    if not failures:
+        return
+
+    failed_insight_pks = set()
+    failed_tile_pks = set()
+    for candidate, _ in failures:
+        if isinstance(candidate, Insight):
+            failed_insight_pks.add(candidate.pk)
+        else:
+            failed_insight_pks.add(candidate.insight_id)
+            failed_tile_pks.add(candidate.pk)
+
+    with transaction.atomic():
+        # refresh_attempt is nullable, so a bare F() + 1 would leave NULLs untouched
+        Insight.objects.filter(pk__in=failed_insight_pks).update(
+            refresh_attempt=Coalesce(F("refresh_attempt"), 0) + 1
+        )
+        if failed_tile_pks:
+            DashboardTile.objects.filter(pk__in=failed_tile_pks).update(
+                refresh_attempt=Coalesce(F("refresh_attempt"), 0) + 1
+            )
+
+    # one sentry event per distinct error type, not one per candidate
+    seen_error_types = set()
+    for _, error in failures:
+        if type(error) not in seen_error_types:
+            seen_error_types.add(type(error))
+            capture_exception(error)
+
+
+def gauge_cache_update_candidates(dashboard_tiles: QuerySet, shared_insights: QuerySet) -> Tuple[int, int]:
+    # one scan for both tile counts instead of a COUNT(*) round-trip per gauge
+    tile_counts = dashboard_tiles.aggregate(
+        total=Count("id"),
+        never_refreshed=Count("id", filter=Q(insight__isnull=False, last_refresh__isnull=True)),
     )
-    oldest_previously_refreshed_tiles: List[DashboardTile] = list(
-        dashboard_tiles.exclude(insight=None).exclude(last_refresh=None)[0:10]
+    insights_count = shared_insights.count()
+
+    statsd.gauge("update_cache_queue.never_refreshed", tile_counts["never_refreshed"])
+    # the gauges only need four columns, so skip hydrating full tile/insight/dashboard instances
+    oldest_previously_refreshed_tiles = list(
+        dashboard_tiles.exclude(insight=None)
+        .exclude(last_refresh=None)
+        .values_list("insight_id", "dashboard_id", "filters_hash", "last_refresh", named=True)[0:10]
     )
     ages = []
     for candidate_tile in oldest_previously_refreshed_tiles:
@@ -136,9 +229,11 @@ def gauge_cache_update_candidates(dashboard_tiles: QuerySet, shared_insights: Qu
     logger.info("update_cache_queue.seen_ages", ages=ages)
 
     # this is the number of cacheable items that match the query
-    statsd.gauge("update_cache_queue_depth.shared_insights", shared_insights.count())
-    statsd.gauge("update_cache_queue_depth.dashboards", dashboard_tiles.count())
-    statsd.gauge("update_cache_queue_depth", dashboard_tiles.count() + shared_insights.count())
+    statsd.gauge("update_cache_queue_depth.shared_insights", insights_count)
+    statsd.gauge("update_cache_queue_depth.dashboards", tile_counts["total"])
+    statsd.gauge("update_cache_queue_depth", tile_counts["total"] + insights_count)
+
+    return tile_counts["total"], insights_count
 
 
 @timed("update_cache_item_timer")
@@ -146,16 +241,17 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> Optiona
 
     dashboard_id = payload.get("dashboard_id", None)
     insight_id = payload.get("insight_id", "unknown")
-    filter_dict = json.loads(payload["filter"])
+    # the scheduler now sends the filter as a dict; tasks queued before a deploy
+    # may still carry the old JSON-string form
+    filter_payload = payload["filter"]
+    filter_dict = json.loads(filter_payload) if isinstance(filter_payload, str) else filter_payload
     team_id = int(payload["team_id"])
 
-    team = Team.objects.get(pk=team_id)
+    team = _team_for_cache_update(team_id)
     filter = get_filter(data=filter_dict, team=team)
 
     insights_queryset = Insight.objects.filter(Q(team_id=team_id, filters_hash=key))
-    insights_queryset.update(refreshing=True)
     dashboard_tiles_queryset = DashboardTile.objects.filter(insight__team_id=team_id, filters_hash=key)
-    dashboard_tiles_queryset.update(refreshing=True)
 
     cache_update_reporting = CacheUpdateReporting(
         dashboard_id=dashboard_id,
@@ -169,11 +265,19 @@ def update_cache_item(key: str, cache_type: CacheType, payload: dict) -> Optiona
     result = None
 
     if cache_includes_latest_events(payload, filter):
+        # nothing to recompute - don't mark rows refreshing just to unmark them
         cache.touch(key, timeout=settings.CACHED_RESULTS_TTL)
         cache_update_reporting.on_results("update_cache_item_can_skip_because_events_do_not_invalidate_cache")
     else:
+        # both updates are deliberate - every row sharing this cache key is marked so the
+        # next scheduler tick doesn't queue duplicate work; one transaction, one commit
+        with transaction.atomic():
+            insights_updated = insights_queryset.update(refreshing=True)
+            tiles_updated = dashboard_tiles_queryset.update(refreshing=True)
+
         try:
-            if (dashboard_id and dashboard_tiles_queryset.exists()) or insights_queryset.exists():
+            # the updates just reported how many rows matched - no need to ask again
+            if (dashboard_id and tiles_updated) or insights_updated:
                 result = _update_cache_for_queryset(cache_type, filter, key, team)
         except Exception as e:
             cache_update_reporting.on_query_error(e)
@@ -238,11 +342,14 @@ def update_filters_hash(cache_key: str, dashboard: Optional[Dashboard], insight:
             filters_hash=cache_key
         )
 
+        # capture the mismatched keys before the update - re-evaluating the queryset
+        # afterwards would show the freshly written value, not what was wrong
+        stale_cache_keys = list(dashboard_tiles.values_list("filters_hash", flat=True))
         count_of_updated_tiles = dashboard_tiles.update(filters_hash=cache_key)
         if count_of_updated_tiles:
             logger.info(
                 "update_cache_dashboard_tile_incorrect_filters_hash",
-                current_cache_keys=[dt.filters_hash for dt in dashboard_tiles],
+                current_cache_keys=stale_cache_keys,
                 correct_cache_key=cache_key,
             )
 
@@ -261,7 +368,9 @@ def update_filters_hash(cache_key: str, dashboard: Optional[Dashboard], insight:
             )
     if should_update_insight_filters_hash:
         insight.filters_hash = cache_key
-        insight.save()
+        # a full save would rewrite every column; the pre_save receiver explicitly
+        # skips recomputing the hash for this update_fields set
+        insight.save(update_fields=["filters_hash"])
 
         statsd.incr(
             "update_cache_item_set_new_cache_key_on_shared_insight",
@@ -277,11 +386,14 @@ def insight_update_task_params(
     whose events haven't been ingested since the last_refresh datetime
     """
     filter = get_filter(data=insight.dashboard_filters(dashboard), team=insight.team)
-    cache_key = generate_cache_key("{}_{}".format(filter.toJSON(), insight.team_id))
+    # serialize the filter once - toJSON and to_dict each walk the whole filter,
+    # and the cache key must keep hashing the exact toJSON form
+    filter_json = filter.toJSON()
+    cache_key = _insight_cache_key(filter_json, insight.team_id)
 
     cache_type = get_cache_type(filter)
     payload = {
-        "filter": filter.toJSON(),
+        "filter": json.loads(filter_json),
         "team_id": insight.team_id,
         "insight_id": insight.id,
         "dashboard_id": None if not dashboard else dashboard.id,
@@ -1,4 +1,5 @@
 import datetime
+import time
 from typing import List, Optional, Set, Tuple, Union
 
 from dateutil.parser import parser
@@ -10,6 +11,12 @@ RECENTLY_ACCESSED_TEAMS_REDIS_KEY = "INSIGHT_CACHE_UPDATE_RECENTLY_ACCESSED_TEAM
 
 IN_A_DAY = 86_400
 
+# the scheduler beat can call active_teams several times in quick succession;
+# hold the redis result in-process for a short window to avoid repeat round-trips
+ACTIVE_TEAMS_CACHE_TTL_SECONDS = 30
+
+_active_teams_cache: Optional[Tuple[float, Set[int]]] = None
+
 
 def ensure_is_date(candidate: Optional[Union[str, datetime.datetime]]) -> Optional[datetime.datetime]:
     if candidate is None:
@@ -28,7 +35,15 @@ def active_teams() -> Set[int]:
     That is, if a team has not ingested events in the last seven days, why refresh its insights?
     And could let us process the teams in order of how recently they ingested events.
     This assumes that the list of active teams is small enough to reasonably load in one go.
+    The result is memoized in-process for ACTIVE_TEAMS_CACHE_TTL_SECONDS.
     """
+    global _active_teams_cache
+
+    if _active_teams_cache is not None:
+        cached_at, teams = _active_teams_cache
+        if time.monotonic() - cached_at < ACTIVE_TEAMS_CACHE_TTL_SECONDS:
+            return teams
+
     redis = get_client()
     all_teams: List[Tuple[bytes, float]] = redis.zrange(RECENTLY_ACCESSED_TEAMS_REDIS_KEY, 0, -1, withscores=True)
     if not all_teams:
@@ -47,4 +62,6 @@ def active_teams() -> Set[int]:
         redis.expire(RECENTLY_ACCESSED_TEAMS_REDIS_KEY, IN_A_DAY)
         all_teams = teams_by_recency
 
-    return set(int(team_id) for team_id, _ in all_teams)
+    teams = set(int(team_id) for team_id, _ in all_teams)
+    _active_teams_cache = (time.monotonic(), teams)
+    return teams
@@ -0,0 +1,11 @@
+from infi.clickhouse_orm import migrations
+
+from posthog.models.group.sql import GROUPS_TABLE_MV_SQL, KAFKA_GROUPS_TABLE_SQL
+from posthog.settings import CLICKHOUSE_CLUSTER
+
+operations = [
+    migrations.RunSQL(f"DROP TABLE IF EXISTS groups_mv ON CLUSTER '{CLICKHOUSE_CLUSTER}'"),
+    migrations.RunSQL(f"DROP TABLE IF EXISTS kafka_groups ON CLUSTER '{CLICKHOUSE_CLUSTER}'"),
+    migrations.RunSQL(KAFKA_GROUPS_TABLE_SQL()),
+    migrations.RunSQL(GROUPS_TABLE_MV_SQL),
+]
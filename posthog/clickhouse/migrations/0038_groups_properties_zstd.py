@@ -0,0 +1,9 @@
+from infi.clickhouse_orm import migrations
+
+from posthog.settings import CLICKHOUSE_CLUSTER
+
+operations = [
+    migrations.RunSQL(
+        f"ALTER TABLE groups ON CLUSTER '{CLICKHOUSE_CLUSTER}' MODIFY COLUMN group_properties VARCHAR CODEC(ZSTD(3))"
+    )
+]
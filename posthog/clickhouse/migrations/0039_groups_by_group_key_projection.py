@@ -0,0 +1,13 @@
+from infi.clickhouse_orm import migrations
+
+from posthog.settings import CLICKHOUSE_CLUSTER
+
+operations = [
+    migrations.RunSQL(
+        f"ALTER TABLE groups ON CLUSTER '{CLICKHOUSE_CLUSTER}' "
+        "ADD PROJECTION IF NOT EXISTS groups_by_group_key (SELECT * ORDER BY (team_id, group_key))"
+    ),
+    migrations.RunSQL(
+        f"ALTER TABLE groups ON CLUSTER '{CLICKHOUSE_CLUSTER}' MATERIALIZE PROJECTION groups_by_group_key"
+    ),
+]
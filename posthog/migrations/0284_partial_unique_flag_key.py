@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2022-12-07 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0283_prompt_sequence_model"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="featureflag",
+            name="unique key for team",
+        ),
+        migrations.AddConstraint(
+            model_name="featureflag",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("deleted", False)),
+                fields=("team", "key"),
+                name="unique key for team",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.16 on 2022-12-07 11:40
+
+from django.db import migrations, models
+
+
+def backfill_simple_flag_fields(apps, schema_editor):
+    FeatureFlag = apps.get_model("posthog", "FeatureFlag")
+
+    batch = []
+    for flag in FeatureFlag.objects.all().iterator(chunk_size=500):
+        filters = flag.filters or {}
+        if "groups" not in filters:
+            # Legacy flags store properties/rollout_percentage at the top level
+            filters = {
+                "groups": [
+                    {"properties": filters.get("properties", []), "rollout_percentage": flag.rollout_percentage}
+                ]
+            }
+        conditions = filters.get("groups", []) or []
+        flag.is_simple_flag = (
+            len(conditions) == 1
+            and all(len(condition.get("properties", []) or []) == 0 for condition in conditions)
+            and filters.get("aggregation_group_type_index") is None
+        )
+        flag.simple_rollout_percentage = conditions[0].get("rollout_percentage") if flag.is_simple_flag else None
+        batch.append(flag)
+        if len(batch) >= 500:
+            FeatureFlag.objects.bulk_update(batch, ["is_simple_flag", "simple_rollout_percentage"])
+            batch = []
+    if batch:
+        FeatureFlag.objects.bulk_update(batch, ["is_simple_flag", "simple_rollout_percentage"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0284_partial_unique_flag_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="featureflag",
+            name="is_simple_flag",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="featureflag",
+            name="simple_rollout_percentage",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_simple_flag_fields, migrations.RunPython.noop, elidable=True),
+    ]
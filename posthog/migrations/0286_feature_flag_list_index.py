@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2022-12-07 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0285_feature_flag_simple_flag_fields"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="featureflag",
+            index=models.Index(
+                condition=models.Q(("deleted", False)),
+                fields=["team", "-created_at"],
+                name="flag_team_created_not_deleted",
+            ),
+        ),
+    ]
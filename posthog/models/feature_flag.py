@@ -65,9 +65,29 @@ class FeatureFlagMatch:
     condition_index: Optional[int] = None
 
 
+class ActiveFeatureFlagManager(models.Manager):
+    """Excludes soft-deleted flags. The default manager keeps them so key-reuse checks still see them."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=False)
+
+
 class FeatureFlag(models.Model):
     class Meta:
-        constraints = [models.UniqueConstraint(fields=["team", "key"], name="unique key for team")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["team", "key"], condition=models.Q(deleted=False), name="unique key for team"
+            )
+        ]
+        indexes = [
+            # Matches the list endpoint's filter + ordering so Postgres can walk the
+            # index instead of sorting, while skipping soft-deleted rows entirely
+            models.Index(
+                fields=["team", "-created_at"],
+                name="flag_team_created_not_deleted",
+                condition=models.Q(deleted=False),
+            )
+        ]
 
     key: models.CharField = models.CharField(max_length=400)
     name: models.TextField = models.TextField(
@@ -88,6 +108,24 @@ class FeatureFlag(models.Model):
 
     ensure_experience_continuity: models.BooleanField = models.BooleanField(default=False, null=True, blank=True)
 
+    # Denormalized from `filters`, maintained in save(). Flags are read far more often than
+    # they are written, so this avoids re-deriving both values on every serialization
+    is_simple_flag: models.BooleanField = models.BooleanField(default=False)
+    simple_rollout_percentage: models.IntegerField = models.IntegerField(null=True, blank=True)
+
+    objects = models.Manager()
+    active_objects = ActiveFeatureFlagManager()
+
+    def save(self, *args, **kwargs):
+        conditions = self.conditions
+        self.is_simple_flag = (
+            len(conditions) == 1
+            and all(len(condition.get("properties", [])) == 0 for condition in conditions)
+            and self.aggregation_group_type_index is None
+        )
+        self.simple_rollout_percentage = conditions[0].get("rollout_percentage") if self.is_simple_flag else None
+        super().save(*args, **kwargs)
+
     def get_analytics_metadata(self) -> Dict:
         filter_count = sum(len(condition.get("properties", [])) for condition in self.conditions)
         variants_count = len(self.variants)
@@ -612,8 +650,12 @@ def get_active_feature_flags(
     group_property_value_overrides: Dict[str, Dict[str, str]] = {},
 ) -> Tuple[Dict[str, Union[str, bool]], Dict[str, dict]]:
 
-    all_feature_flags = FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).only(
-        "id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity"
+    # Stream rows in chunks rather than hydrating the whole result set in one buffer -
+    # teams can have thousands of flags, and we iterate the list more than once below
+    all_feature_flags = list(
+        FeatureFlag.active_objects.filter(team_id=team_id, active=True)
+        .only("id", "team_id", "filters", "key", "rollout_percentage", "ensure_experience_continuity")
+        .iterator(chunk_size=500)
     )
 
     flags_have_experience_continuity_enabled = any(
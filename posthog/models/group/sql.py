@@ -17,11 +17,17 @@ CREATE TABLE IF NOT EXISTS {table_name} ON CLUSTER '{cluster}'
     group_key VARCHAR,
     created_at DateTime64,
     team_id Int64,
-    group_properties VARCHAR
+    group_properties VARCHAR CODEC(ZSTD(3))
     {extra_fields}
 ) ENGINE = {engine}
 """
 
+# The sort key leads with group_type_index, so lookups by (team_id, group_key) alone
+# can't binary-search the primary index. Keep a projection sorted for that access path.
+GROUPS_TABLE_PROJECTION_FIELDS = """
+, PROJECTION groups_by_group_key (SELECT * ORDER BY (team_id, group_key))
+"""
+
 GROUPS_TABLE_ENGINE = lambda: ReplacingMergeTree(GROUPS_TABLE, ver="_timestamp")
 GROUPS_TABLE_SQL = lambda: (
     GROUPS_TABLE_BASE_SQL
@@ -32,11 +38,19 @@ GROUPS_TABLE_SQL = lambda: (
     table_name=GROUPS_TABLE,
     cluster=CLICKHOUSE_CLUSTER,
     engine=GROUPS_TABLE_ENGINE(),
-    extra_fields=KAFKA_COLUMNS,
+    extra_fields=KAFKA_COLUMNS + GROUPS_TABLE_PROJECTION_FIELDS,
     storage_policy=STORAGE_POLICY(),
 )
 
-KAFKA_GROUPS_TABLE_SQL = lambda: GROUPS_TABLE_BASE_SQL.format(
+# groups is a low-volume topic. With default engine settings ClickHouse waits for
+# kafka_max_block_size (65536) rows before flushing to the MV, which can delay group
+# updates by minutes - flush small blocks every couple of seconds instead.
+KAFKA_GROUPS_TABLE_SQL = lambda: (
+    GROUPS_TABLE_BASE_SQL
+    + """
+    SETTINGS kafka_max_block_size = 8192, kafka_flush_interval_ms = 2000
+"""
+).format(
     table_name="kafka_" + GROUPS_TABLE, cluster=CLICKHOUSE_CLUSTER, engine=kafka_engine(KAFKA_GROUPS), extra_fields=""
 )
 
@@ -57,7 +71,11 @@ FROM {CLICKHOUSE_DATABASE}.kafka_{GROUPS_TABLE}
 """
 
 # { ..., "group_0": 1325 }
-# To join with events join using $group_{group_type_index} column
+# To join with events, join on the events.$group_{group_type_index} column.
+# Those are MATERIALIZED columns extracted from event properties at ingestion time
+# (see posthog/models/event/sql.py), so the join compares native string columns -
+# never JSONExtract events.properties per row, which would parse the JSON blob
+# for every event scanned.
 
 TRUNCATE_GROUPS_TABLE_SQL = f"TRUNCATE TABLE IF EXISTS {GROUPS_TABLE} ON CLUSTER '{CLICKHOUSE_CLUSTER}'"
 